@@ -71,6 +71,8 @@ PYTHON_PACKAGES=(\
   "pandas" \
   "requests" \
   "psutil" \
+  "psycopg2-binary" \
+  "inotify_simple" \
   "distro"  \
   "PTable"
 )
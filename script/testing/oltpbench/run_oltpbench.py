@@ -14,6 +14,7 @@ from oltpbench.test_case_oltp import TestCaseOLTPBench
 from oltpbench.test_oltpbench import TestOLTPBench
 from oltpbench.utils import parse_command_line_args
 from oltpbench import constants
+from util.common import construct_server_argv
 from util.constants import LOG
 
 def generate_test_suite(args):
@@ -57,8 +58,9 @@ def generate_test_suite(args):
         # if need to loop over parameters, for example terminals = 1,2,4,8,16
         if oltp_testcase_loop:
             for loop_item in oltp_testcase_loop:
-                oltp_testcase_combined = {**oltp_testcase_base, **loop_item}             
-                oltp_test_suite.append(TestCaseOLTPBench(oltp_testcase_combined)) 
+                oltp_testcase_combined = oltp_testcase_base.copy()
+                oltp_testcase_combined.update(loop_item)
+                oltp_test_suite.append(TestCaseOLTPBench(oltp_testcase_combined))
 
         else:
             # there is no loop
@@ -89,21 +91,21 @@ def load_test_suite(configfile_path):
     return test_suite_json
 
 def get_server_args(test_suite_json):
-    """ Create a server args string to pass to the DBMS """
+    """ Create the list of server args to pass to the DBMS """
     server_args_json = test_suite_json.get('server_args')
 
     if server_args_json:
-        server_args = ''
-        for attribute, value in server_args_json.items():
-            server_args = '{SERVER_ARGS} -{ATTRIBUTE}={VALUE}'.format(SERVER_ARGS=server_args,ATTRIBUTE=attribute,VALUE=value)
-            
-            #Delete the logfile before each run
-            if attribute == 'wal_file_path':
-                previous_logfile_path = str(value)
-                if os.path.exists(previous_logfile_path):
-                    os.remove(previous_logfile_path)
-            
-        return server_args
+        #Delete the logfile before each run
+        previous_logfile_path = server_args_json.get('wal_file_path')
+        if previous_logfile_path:
+            # unlink directly instead of stat-then-remove: one syscall
+            # and no window for the file to vanish in between
+            try:
+                os.unlink(str(previous_logfile_path))
+            except FileNotFoundError:
+                pass
+
+        return construct_server_argv(server_args_json)
 
 def get_server_metadata(test_suite_json, max_connection_threads, wal_enable):
     """ Aggregate all the server metadata in one dictionary """
@@ -8,9 +8,13 @@ import signal
 import errno
 import psutil
 import datetime
+import time
 from util.constants import LOG
 from util import constants
 
+# value prefixes that mark a server arg as a relative path
+RELATIVE_PATH_PREFIXES = ("./", "../")
+
 
 def run_command(command,
                 error_msg="",
@@ -50,6 +54,102 @@ def run_as_root(command, printable=True):
                        printable=printable)
 
 
+def wait_with_deadline(process, deadline):
+    """
+    Poll the subprocess with exponential backoff until it exits or until
+    deadline (seconds) passes. Returns True if the process exited in time.
+    """
+    end_time = time.time() + deadline
+    sleep_time = 0.01
+    while process.poll() is None:
+        if time.time() >= end_time:
+            return False
+        time.sleep(sleep_time)
+        sleep_time = min(sleep_time * 1.5, 0.5)
+    return True
+
+
+def construct_server_argument(attribute, value, bin_dir=None):
+    """
+    Turn one (attribute, value) pair from a test config into a DBMS command
+    line argument. Bool lowering, relative path resolution against bin_dir,
+    and value-less flags are all handled in a single pass. bin_dir, when
+    given, must already end with a path separator (construct_server_argv
+    normalizes it once for the whole argv).
+    """
+    if value is None:
+        return "-{}".format(attribute)
+    if isinstance(value, bool):
+        value = "true" if value else "false"
+    elif bin_dir and isinstance(value, str) and value.startswith(
+            RELATIVE_PATH_PREFIXES):
+        value = bin_dir + value
+    return "-{}={}".format(attribute, value)
+
+
+def server_arg_kind(value):
+    """ Classify a server arg value for the specialized argv builders """
+    if value is None:
+        return "flag"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, str) and value.startswith(RELATIVE_PATH_PREFIXES):
+        return "path"
+    return "plain"
+
+
+def make_server_argv_builder(schema):
+    """
+    Generate an argv builder specialized for one server-arg schema (a
+    tuple of (attribute, kind) pairs) via exec(). The per-attribute
+    decisions from construct_server_argument are baked into straight-line
+    code, so rebuilding the argv for a config layout seen before does no
+    type dispatch at all.
+    """
+    lines = ["def build(values, bin_dir):", "    return ["]
+    for attribute, kind in schema:
+        if kind == "flag":
+            lines.append("        '-{}',".format(attribute))
+        elif kind == "bool":
+            lines.append("        '-{0}=' + ('true' if values['{0}'] "
+                         "else 'false'),".format(attribute))
+        elif kind == "path":
+            lines.append("        '-{0}=' + (bin_dir + values['{0}'] "
+                         "if bin_dir else values['{0}']),".format(attribute))
+        else:
+            lines.append(
+                "        '-{0}={{}}'.format(values['{0}']),".format(attribute))
+    lines.append("    ]")
+    namespace = {}
+    exec("\n".join(lines), namespace)
+    return namespace["build"]
+
+
+# specialized argv builders, keyed on the (attribute, kind) schema so
+# parameterized sweeps that reuse one config layout pay codegen once
+SERVER_ARGV_BUILDERS = {}
+
+
+def construct_server_argv(server_args, bin_dir=None):
+    """ Create the list of command line args to pass to the DBMS """
+    # normalize the bin dir once so per-arg resolution is a concatenation
+    # instead of an os.path.join
+    if bin_dir:
+        bin_dir = bin_dir.rstrip("/") + "/"
+    schema = tuple((attribute, server_arg_kind(value))
+                   for attribute, value in server_args.items())
+    builder = SERVER_ARGV_BUILDERS.get(schema)
+    if builder is None:
+        builder = make_server_argv_builder(schema)
+        SERVER_ARGV_BUILDERS[schema] = builder
+    return builder(server_args, bin_dir)
+
+
+def construct_server_args_string(server_args, bin_dir=None):
+    """ Create a server args string to pass to the DBMS """
+    return " ".join(construct_server_argv(server_args, bin_dir))
+
+
 def print_file(filename):
     """ Print out contents of a file """
     try:
@@ -13,6 +13,7 @@ DIR_TMP = "/tmp"
 # default settings of the TestServer
 DEFAULT_DB_HOST = "localhost"
 DEFAULT_DB_PORT = 15721
+DEFAULT_DB_USER = "noisepage"
 DEFAULT_DB_OUTPUT_FILE = "/tmp/db_log.txt"
 DEFAULT_DB_BIN = "noisepage"
 DEFAULT_TEST_OUTPUT_FILE = "/tmp/noisepage_test_{}.log".format(
@@ -22,12 +23,30 @@ DEFAULT_CONTINUE_ON_ERROR = False
 
 # Number of seconds to wait after starting the DBMS before trying to connect
 DB_START_WAIT = 1  # seconds
+# Number of seconds to wait for the DBMS to report that it is ready
+DB_START_TIMEOUT = 60  # seconds
+# Number of seconds to wait for the DBMS to exit after SIGTERM / SIGKILL
+DB_TERMINATE_TIMEOUT = 10  # seconds
+DB_KILL_TIMEOUT = 5  # seconds
 # Number of times we will try to start the DBMS and connect to it
 DB_START_ATTEMPTS = 2
 # For each start attempt, the number of times we will attempt to connect to the DBMS
 DB_CONNECT_ATTEMPTS = 50
 # How long to wait before each connection attempt
 DB_CONNECT_SLEEP = 0.2  # seconds
+# Log line the DBMS prints once it is ready to accept connections
+DB_READY_MESSAGE = "[info] Listening on Unix domain socket with port {PORT} [PID={PID}]"
+# Where the DBMS puts its Unix domain socket (see uds_file_directory and
+# UNIX_DOMAIN_SOCKET_FORMAT_STRING in the server)
+DEFAULT_DB_SOCKET_DIR = "/tmp"
+DB_SOCKET_FILE = ".s.PGSQL.{PORT}"
+# Bounds for the psycopg2 connection pool used by TestServer.execute()
+DB_POOL_MIN_CONNECTIONS = 1
+DB_POOL_MAX_CONNECTIONS = 8
+# Maximum number of DB output lines retained for print_db_logs()
+DB_LOG_RING_SIZE = 10000
+# Number of rows fetched per round-trip by TestServer.execute_iter()
+DB_CURSOR_ITERSIZE = 10000
 
 # Logging settings
 LOG = logging.getLogger(__name__)
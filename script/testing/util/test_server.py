@@ -1,18 +1,51 @@
 #!/usr/bin/python3
+import collections
+import functools
 import os
+import selectors
 import socket
 import subprocess
 import sys
+import threading
 import time
 import traceback
 import shlex
 from typing import List
+import psycopg2
+import psycopg2.pool
 from util import constants
 from util.test_case import TestCase
-from util.common import run_command, print_file, run_check_pids, run_kill_server, print_pipe
+from util.common import run_command, print_file, run_check_pids, run_kill_server, wait_with_deadline
 from util.constants import LOG, ErrorCode
 
 
+@functools.lru_cache(maxsize=None)
+def get_binary_directory(build_type):
+    """
+    Find the directory that holds the DB binary for the given build type.
+    The result is cached because parameterized sweeps construct many server
+    objects with the same build type, and each lookup is a stat syscall.
+    """
+    # builds on Jenkins are in build/bin
+    # but CLion creates cmake-build-<build_type>/bin
+    # determine what we have and return the directory accordingly
+    path_list = [
+        os.path.join(constants.DIR_REPO, "build", "bin"),
+        os.path.join(constants.DIR_REPO,
+                     "cmake-build-{}".format(build_type), "bin")
+    ]
+    for dir_name in path_list:
+        try:
+            # one stat covers the existence check
+            os.stat(os.path.join(dir_name, constants.DEFAULT_DB_BIN))
+        except FileNotFoundError:
+            continue
+        return dir_name
+
+    msg = "No DB binary found in {}".format(path_list)
+    raise RuntimeError(msg)
+
+
 class TestServer:
     """ Class to run general tests """
     def __init__(self, args):
@@ -31,13 +64,56 @@ class TestServer:
         # db server location
         self.db_host = self.args.get("db_host", constants.DEFAULT_DB_HOST)
         self.db_port = self.args.get("db_port", constants.DEFAULT_DB_PORT)
+        self.db_user = self.args.get("db_user", constants.DEFAULT_DB_USER)
+
+        # connection pool for execute(), created lazily on the first SQL call
+        # so that test suites which never issue SQL pay nothing
+        self.db_pool = None
+        self.db_pool_user = None
+        # connection kept checked out of the pool between execute() calls,
+        # plus the autocommit state it was last configured with
+        self.db_conn = None
+        self.db_conn_autocommit = None
+
+        # bounded ring of DB output lines filled by the drain threads, so
+        # a chatty server can never back up the pipe and block on write()
+        self.db_log_ring = collections.deque(maxlen=constants.DB_LOG_RING_SIZE)
+        self.db_log_threads = []
 
         # whether the server should stop the whole test if one of test cases failed
         self.continue_on_error = self.args.get(
             "continue_on_error", constants.DEFAULT_CONTINUE_ON_ERROR)
 
+        # how long stop_db() waits after SIGTERM / SIGKILL before moving on
+        self.db_terminate_timeout = self.args.get(
+            "db_terminate_timeout", constants.DB_TERMINATE_TIMEOUT)
+        self.db_kill_timeout = self.args.get("db_kill_timeout",
+                                             constants.DB_KILL_TIMEOUT)
+
         return
 
+    def __getstate__(self):
+        """
+        Support pickling so a TestServer can be handed to multiprocessing
+        workers. Live handles (the DBMS process, SQL connections, and the
+        log drain threads) cannot cross a process boundary, so they are
+        stripped: the worker must call run_db() itself, and each worker
+        needs its own db_port so the instances do not collide.
+        """
+        state = self.__dict__.copy()
+        state["db_process"] = None
+        state["db_pool"] = None
+        state["db_pool_user"] = None
+        state["db_conn"] = None
+        state["db_conn_autocommit"] = None
+        state["db_log_threads"] = []
+        state["db_log_ring"] = collections.deque(
+            maxlen=constants.DB_LOG_RING_SIZE)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
     def run_pre_suite(self):
         pass
 
@@ -46,30 +122,21 @@ class TestServer:
 
     def set_db_path(self):
         """ location of db server, relative to this script """
-
-        # builds on Jenkins are in build/bin
-        # but CLion creates cmake-build-<build_type>/bin
-        # determine what we have and set the server path accordingly
-        bin_name = constants.DEFAULT_DB_BIN
         build_type = self.args.get("build_type", "")
-        path_list = [
-            os.path.join(constants.DIR_REPO, "build", "bin"),
-            os.path.join(constants.DIR_REPO,
-                         "cmake-build-{}".format(build_type), "bin")
-        ]
-        for dir_name in path_list:
-            db_bin_path = os.path.join(dir_name, bin_name)
-            if os.path.exists(db_bin_path):
-                full_path = db_bin_path
-                server_args = self.args.get("server_args", "").strip()
-                if server_args:
-                    full_path = db_bin_path + " " + server_args
-                self.db_bin_path = db_bin_path
-                self.db_path = full_path
-                return
-
-        msg = "No DB binary found in {}".format(path_list)
-        raise RuntimeError(msg)
+        bin_dir = get_binary_directory(build_type)
+        LOG.debug("Using DB binary directory {}".format(bin_dir))
+
+        db_bin_path = os.path.join(bin_dir, constants.DEFAULT_DB_BIN)
+        # server_args is either a ready argv list (from the test configs)
+        # or a string (from the command line), which is lexed exactly once
+        server_args = self.args.get("server_args", [])
+        if isinstance(server_args, str):
+            server_args = shlex.split(server_args)
+        self.db_bin_path = db_bin_path
+        self.db_argv = [db_bin_path] + server_args
+        # printable form of the launch command, kept only for logging
+        self.db_path = " ".join(self.db_argv)
+        return
 
     def check_db_binary(self):
         """ Check that a Db binary is available """
@@ -89,10 +156,23 @@ class TestServer:
             # early terminate the run_db if kill_server.py encounter any exceptions
             run_kill_server(self.db_port)
 
+            # kill -9 never unlinks the socket and the server only removes
+            # it on graceful shutdown, so clear any stale one here or the
+            # socket-watch readiness check would trust a leftover file
+            try:
+                os.unlink(self.get_db_socket_path())
+            except FileNotFoundError:
+                pass
+
             # use memory buffer to hold db logs
-            self.db_process = subprocess.Popen(shlex.split(self.db_path),
+            # close_fds=False lets CPython (3.8+, Linux/glibc) launch the
+            # child via posix_spawn instead of fork+exec, skipping the
+            # page-table copy of the whole test-runner process; the DBMS
+            # ignores any descriptors it inherits
+            self.db_process = subprocess.Popen(self.db_argv,
                                                stdout=subprocess.PIPE,
-                                               stderr=subprocess.PIPE)
+                                               stderr=subprocess.PIPE,
+                                               close_fds=False)
             LOG.info("Server start: {PATH} [PID={PID}]".format(
                 PATH=self.db_path, PID=self.db_process.pid))
 
@@ -100,27 +180,273 @@ class TestServer:
                 # The DB process does not exist, try starting it again
                 continue
 
-            check_line = "[info] Listening on Unix domain socket with port {PORT} [PID={PID}]".format(
-                PORT=self.db_port, PID=self.db_process.pid)
-            while True:
-                db_log_line_raw = self.db_process.stdout.readline()
-                if not db_log_line_raw:
-                    break
-                db_log_line_str = db_log_line_raw.decode("utf-8").rstrip("\n")
-                LOG.info(db_log_line_str)
-                if db_log_line_str.endswith(check_line):
-                    LOG.info("DB process is verified as running")
-                    return
+            if self.wait_for_db_ready():
+                return
 
         msg = "Failed to start DB after {} attempts".format(
             constants.DB_START_ATTEMPTS)
         raise RuntimeError(msg)
 
+    def get_db_socket_path(self):
+        """ Path of the Unix domain socket the DBMS creates when ready """
+        socket_dir = constants.DEFAULT_DB_SOCKET_DIR
+        for arg in self.db_argv:
+            if arg.startswith("-uds_file_directory="):
+                socket_dir = arg.split("=", 1)[1]
+        return os.path.join(socket_dir,
+                            constants.DB_SOCKET_FILE.format(PORT=self.db_port))
+
+    def wait_for_db_ready(self):
+        """
+        Wait until the DB server is ready to accept connections. When
+        inotify is available the wait is a directory watch for the server's
+        Unix domain socket showing up, which involves no log parsing at
+        all; otherwise fall back to scanning stdout for the readiness line.
+        Returns True if the DB server came up in time.
+        """
+        try:
+            from inotify_simple import INotify, flags
+        except ImportError:
+            return self.wait_for_db_output()
+
+        # the socket watch does not consume stdout, so start draining the
+        # pipes right away or the server could block on a full pipe before
+        # it ever binds the socket
+        self.start_db_log_drain()
+
+        socket_path = self.get_db_socket_path()
+        inotify = INotify()
+        try:
+            inotify.add_watch(os.path.dirname(socket_path), flags.CREATE)
+            # run_db unlinked any stale socket before spawning, so one that
+            # exists now was created by this server between spawn and watch
+            if os.path.exists(socket_path):
+                LOG.info("DB process is verified as running")
+                return True
+            socket_name = os.path.basename(socket_path)
+            end_time = time.time() + constants.DB_START_TIMEOUT
+            while True:
+                remaining_ms = (end_time - time.time()) * 1000
+                if remaining_ms <= 0:
+                    LOG.error("Timed out after {}s waiting for the DB".format(
+                        constants.DB_START_TIMEOUT))
+                    self.print_db_logs()
+                    return False
+                if self.db_process.poll() is not None:
+                    LOG.error("DB process died with return code {} before "
+                              "it was ready".format(
+                                  self.db_process.returncode))
+                    self.print_db_logs()
+                    return False
+                # cap each wait so a child that dies without ever creating
+                # the socket is noticed within a second, not at the timeout
+                for event in inotify.read(timeout=min(remaining_ms, 1000)):
+                    if event.name == socket_name:
+                        LOG.info("DB process is verified as running")
+                        return True
+        finally:
+            inotify.close()
+
+    def start_db_log_drain(self):
+        """
+        Keep draining the DB server pipes in the background once the
+        readiness check stops reading them, otherwise the server blocks on
+        write() as soon as it logs more than the pipe buffer holds.
+        """
+        self.db_log_threads = []
+        for pipe in (self.db_process.stdout, self.db_process.stderr):
+            thread = threading.Thread(target=self.drain_db_logs,
+                                      args=(pipe, ),
+                                      daemon=True)
+            thread.start()
+            self.db_log_threads.append(thread)
+
+    def drain_db_logs(self, pipe):
+        """ Read a DB server pipe to EOF into the bounded log ring """
+        for db_log_line in iter(pipe.readline, b""):
+            self.db_log_ring.append(db_log_line)
+
+    def wait_for_db_output(self):
+        """
+        Wait until the readiness line shows up in the DB server output.
+        The wait is event-driven (select on the stdout pipe) and bounded by
+        DB_START_TIMEOUT, so a child that stalls mid-line cannot hang the
+        test runner the way a blocking readline() could.
+        Returns True if the DB server came up in time.
+        """
+        # formatted and encoded once per start attempt, the per-line check
+        # below is then a single suffix memcmp
+        check_bytes = constants.DB_READY_MESSAGE.format(
+            PORT=self.db_port, PID=self.db_process.pid).encode("ascii")
+
+        start_time = time.time()
+        buffer = bytearray()
+        # raw startup lines, only decoded and printed if the startup fails
+        startup_logs = []
+        selector = selectors.DefaultSelector()
+        selector.register(self.db_process.stdout, selectors.EVENT_READ)
+        try:
+            while True:
+                remaining = constants.DB_START_TIMEOUT - (time.time() -
+                                                          start_time)
+                if remaining <= 0:
+                    LOG.error("Timed out after {}s waiting for the DB".format(
+                        constants.DB_START_TIMEOUT))
+                    self.print_startup_logs(startup_logs)
+                    return False
+                if not selector.select(timeout=remaining):
+                    # select timed out, loop back to re-check the deadline
+                    continue
+                chunk = os.read(self.db_process.stdout.fileno(), 4096)
+                if not chunk:
+                    # EOF on stdout, the DB process is gone
+                    self.print_startup_logs(startup_logs)
+                    return False
+                buffer.extend(chunk)
+                # scan any completed lines for the readiness sentinel,
+                # staying in bytes so non-matching lines are never decoded
+                while True:
+                    newline_pos = buffer.find(b"\n")
+                    if newline_pos < 0:
+                        break
+                    db_log_line = bytes(buffer[:newline_pos])
+                    del buffer[:newline_pos + 1]
+                    if db_log_line.endswith(check_bytes):
+                        LOG.info("DB process is verified as running")
+                        self.push_leftover_output(buffer)
+                        self.start_db_log_drain()
+                        return True
+                    startup_logs.append(db_log_line)
+        finally:
+            selector.close()
+
+    def push_leftover_output(self, buffer):
+        """
+        Move bytes already read past the readiness sentinel into the log
+        ring, so they still show up in print_db_logs() once the drain
+        threads take over the pipe. A trailing partial line is pushed
+        as-is; its continuation arrives via the drain thread.
+        """
+        while buffer:
+            newline_pos = buffer.find(b"\n")
+            if newline_pos < 0:
+                self.db_log_ring.append(bytes(buffer))
+                break
+            self.db_log_ring.append(bytes(buffer[:newline_pos + 1]))
+            del buffer[:newline_pos + 1]
+
+    def print_startup_logs(self, startup_logs):
+        """ Print the DB output collected while waiting for readiness """
+        for db_log_line in startup_logs:
+            LOG.error(db_log_line.decode("utf-8", errors="replace"))
+
+    def execute(self, sql, autocommit=True, expect_result=True, user=None):
+        """
+        Run a SQL statement against the DBMS and return the fetched rows
+        (or None if expect_result is False). A single pooled connection is
+        kept checked out between calls so serial statements reuse it, and a
+        dead connection is replaced and retried once.
+        """
+        for retry in range(2):
+            conn = self.get_db_connection(user)
+            try:
+                if self.db_conn_autocommit != autocommit:
+                    conn.autocommit = autocommit
+                    self.db_conn_autocommit = autocommit
+                with conn.cursor() as cursor:
+                    cursor.execute(sql)
+                    if expect_result:
+                        return cursor.fetchall()
+                return None
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                # the cached connection went away, replace it and retry once
+                self.close_db_connection()
+                if retry:
+                    raise
+
+    def execute_iter(self, sql, itersize=constants.DB_CURSOR_ITERSIZE,
+                     user=None):
+        """
+        Run a SQL statement and yield its rows one at a time through a
+        named server-side cursor, so large result sets stream from the DB
+        in itersize batches instead of being materialized in Python memory
+        by a single fetchall(). Use execute() when all rows are needed as
+        a list anyway. The stream runs on its own pooled connection, so a
+        failed statement or an abandoned iterator cannot leave the shared
+        cached connection stuck inside an open transaction.
+        """
+        pool = self.get_db_pool(user)
+        conn = pool.getconn()
+        try:
+            # named cursors must live inside a transaction
+            conn.autocommit = False
+            with conn.cursor(name="testserver_stream") as cursor:
+                cursor.itersize = itersize
+                cursor.execute(sql)
+                for row in cursor:
+                    yield row
+            conn.commit()
+        except BaseException:
+            # covers failed statements and abandoned generators
+            # (GeneratorExit) alike, nothing half-done goes back pooled
+            conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn)
+
+    def get_db_pool(self, user=None):
+        """
+        Return the SQL connection pool, creating it on first use. All the
+        pooled connections authenticate as one user: asking for a
+        different user later raises instead of silently running the
+        statement with the wrong credentials.
+        """
+        user = user if user else self.db_user
+        if not self.db_pool:
+            self.db_pool = psycopg2.pool.ThreadedConnectionPool(
+                constants.DB_POOL_MIN_CONNECTIONS,
+                constants.DB_POOL_MAX_CONNECTIONS,
+                host=self.db_host,
+                port=self.db_port,
+                user=user)
+            self.db_pool_user = user
+        elif user != self.db_pool_user:
+            msg = "SQL connections are pooled for user '{}', cannot execute as '{}'".format(
+                self.db_pool_user, user)
+            raise RuntimeError(msg)
+        return self.db_pool
+
+    def get_db_connection(self, user=None):
+        """ Return the cached SQL connection, (re)opening it if needed """
+        pool = self.get_db_pool(user)
+        if self.db_conn is None or self.db_conn.closed:
+            self.db_conn = pool.getconn()
+            self.db_conn_autocommit = None
+        return self.db_conn
+
+    def close_db_connection(self):
+        """ Return the cached connection to the pool and close it """
+        if self.db_conn is not None:
+            self.db_pool.putconn(self.db_conn, close=True)
+            self.db_conn = None
+            self.db_conn_autocommit = None
+
+    def close_db_pool(self):
+        """ Close all the pooled connections to the DB server """
+        self.close_db_connection()
+        if self.db_pool:
+            self.db_pool.closeall()
+            self.db_pool = None
+            self.db_pool_user = None
+
     def stop_db(self):
         """ Stop the Db server and print it's log file """
         if not self.db_process:
             return
 
+        # drop the SQL connections before taking down the server
+        self.close_db_pool()
+
         # get exit code if any
         self.db_process.poll()
         if self.db_process.returncode is not None:
@@ -132,8 +458,18 @@ class TestServer:
             self.print_db_logs()
             raise RuntimeError(msg)
         else:
-            # still (correctly) running, terminate it
+            # still (correctly) running, ask it to shut down and escalate
+            # to SIGKILL if it has not exited by the deadline
             self.db_process.terminate()
+            if not wait_with_deadline(self.db_process,
+                                      self.db_terminate_timeout):
+                # re-poll before escalating in case the process exited
+                # right at the deadline
+                if self.db_process.poll() is None:
+                    LOG.error("DB ignored SIGTERM for {}s, killing it".format(
+                        self.db_terminate_timeout))
+                    self.db_process.kill()
+                    wait_with_deadline(self.db_process, self.db_kill_timeout)
             LOG.info("DB stops normally")
             self.print_db_logs()
         self.db_process = None
@@ -240,9 +576,15 @@ class TestServer:
         return test_suite_result
 
     def print_db_logs(self):
-        """	
-        Print out the remaining DB logs	
         """
+        Print out the remaining DB logs
+        """
+        # let the drain threads consume whatever is left in the pipes
+        for thread in self.db_log_threads:
+            thread.join(timeout=5)
+        self.db_log_threads = []
         LOG.info("************ DB Logs Start ************")
-        print_pipe(self.db_process)
+        while self.db_log_ring:
+            db_log_line = self.db_log_ring.popleft()
+            LOG.info(db_log_line.decode("utf-8", errors="replace").rstrip("\n"))
         LOG.info("************* DB Logs End *************")